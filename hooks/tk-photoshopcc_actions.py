@@ -12,8 +12,10 @@
 Hook that loads defines all the available actions, broken down by publish type.
 """
 
+import json
 import os
 import re
+import stat
 
 import sgtk
 from sgtk.platform.qt import QtGui
@@ -25,6 +27,72 @@ HookBaseClass = sgtk.get_hook_baseclass()
 _ADD_AS_A_LAYER = "add_as_a_layer"
 _OPEN_FILE = "open_file"
 
+# Action instances returned by generate_actions, which are the same for every publish.
+_ADD_AS_A_LAYER_ACTION = {
+    "name": _ADD_AS_A_LAYER,
+    "params": None,
+    "caption": "Add as a Layer",
+    "description": "Adds a layer referencing the image to the current document.",
+}
+_OPEN_FILE_ACTION = {
+    "name": _OPEN_FILE,
+    "params": None,
+    "caption": "Open File",
+    "description": "This will open the file.",
+}
+
+# Photoshop expects forward slashes, which only need converting to on Windows.
+_SEP_IS_SLASH = os.path.sep == "/"
+
+# Matches file names containing a frame number, e.g. "key_light1.0001.exr".
+_FRAME_REGEX = re.compile(r"(.*)([._-])(\d+)\.([^.]+)$", re.IGNORECASE)
+
+# Matches sequence file names using a python string format frame spec, e.g. "key_light1.%04d.exr".
+_FRAME_SPEC_REGEX = re.compile(r"(.*)([._-])(%0?\d*d)\.([^.]+)$")
+
+
+class _ListdirEntry(object):
+    """
+    Minimal stand-in for os.DirEntry, used where os.scandir isn't available.
+    """
+
+    __slots__ = ("name", "_folder")
+
+    def __init__(self, folder, name):
+        self.name = name
+        self._folder = folder
+
+    def is_dir(self, follow_symlinks=True):
+        """
+        Whether the entry is a folder, as ``os.DirEntry.is_dir`` does.
+
+        :param bool follow_symlinks: If False, symbolic links to folders are
+            not reported as folders.
+        """
+        path = os.path.join(self._folder, self.name)
+        if follow_symlinks:
+            return os.path.isdir(path)
+        return stat.S_ISDIR(os.lstat(path).st_mode)
+
+
+def _scan_folder(folder):
+    """
+    Yields the entries of a folder.
+
+    os.scandir gets the entry type from the directory listing itself, saving a
+    stat call per file. It isn't available in Python 2, where we fall back to
+    os.listdir and only stat the entries that are asked for their type.
+
+    :param folder: The path to the folder to list.
+    """
+    if hasattr(os, "scandir"):
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                yield entry
+    else:
+        for name in os.listdir(folder):
+            yield _ListdirEntry(folder, name)
+
 
 class PhotoshopActions(HookBaseClass):
 
@@ -74,27 +142,16 @@ class PhotoshopActions(HookBaseClass):
             "Actions: %s. Publish Data: %s" % (ui_area, actions, sg_publish_data)
         )
 
+        actions = set(actions)
         action_instances = []
 
+        # the action instances don't depend on the publish, so hand out copies
+        # of the prebuilt ones.
         if _ADD_AS_A_LAYER in actions:
-            action_instances.append(
-                {
-                    "name": _ADD_AS_A_LAYER,
-                    "params": None,
-                    "caption": "Add as a Layer",
-                    "description": "Adds a layer referencing the image to the current document.",
-                }
-            )
+            action_instances.append(_ADD_AS_A_LAYER_ACTION.copy())
 
         if _OPEN_FILE in actions:
-            action_instances.append(
-                {
-                    "name": _OPEN_FILE,
-                    "params": None,
-                    "caption": "Open File",
-                    "description": "This will open the file.",
-                }
-            )
+            action_instances.append(_OPEN_FILE_ACTION.copy())
 
         return action_instances
 
@@ -125,11 +182,18 @@ class PhotoshopActions(HookBaseClass):
 
         :param list actions: Action dictionaries.
         """
-        for single_action in actions:
-            name = single_action["name"]
-            sg_publish_data = single_action["sg_publish_data"]
-            params = single_action["params"]
-            self.execute_action(name, params, sg_publish_data)
+        # paths resolved so far, keyed by publish id, so that several actions
+        # on the same publish only look for its file on disk once.
+        self._resolved_paths = {}
+
+        try:
+            for single_action in actions:
+                name = single_action["name"]
+                sg_publish_data = single_action["sg_publish_data"]
+                params = single_action["params"]
+                self.execute_action(name, params, sg_publish_data)
+        finally:
+            self._resolved_paths = None
 
     def execute_action(self, name, params, sg_publish_data):
         """
@@ -148,32 +212,75 @@ class PhotoshopActions(HookBaseClass):
             "Parameters: %s. Publish Data: %s" % (name, params, sg_publish_data)
         )
 
+        path = self._resolve_publish_path(sg_publish_data)
+
+        if name == _OPEN_FILE:
+            self._open_file(path, sg_publish_data)
+        if name == _ADD_AS_A_LAYER:
+            self._place_file(path, sg_publish_data)
+
+    ###########################################################################
+    # helper methods
+
+    def _resolve_publish_path(self, sg_publish_data):
+        """
+        Resolve the file on disk to load for a publish. For image sequences,
+        this is the first frame of the sequence.
+
+        When called from execute_multiple_actions, the path is only resolved
+        once for all the actions of the batch on the same publish.
+
+        :param sg_publish_data: Shotgun data dictionary with all the standard
+                                publish fields.
+        :returns: Path to an existing file.
+        :raises Exception: If the file can't be found on disk.
+        """
+        # reuse the path found by a previous action of the same batch on this
+        # publish, if any.
+        resolved_paths = getattr(self, "_resolved_paths", None)
+        if resolved_paths is not None:
+            path = resolved_paths.get(sg_publish_data["id"])
+            if path is not None:
+                return path
+
         # resolve path
         # toolkit uses utf-8 encoded strings internally and the Photoshop API expects unicode
         # so convert the path to ensure filenames containing complex characters are supported
         path = six.ensure_text(self.get_publish_path(sg_publish_data))
 
+        # set when the path was found while listing its folder, in which case
+        # there is no need to check for it on disk again.
+        path_verified = False
+
         # Check for image sequence, and search first frame
         if "%" in path:
-            folder = os.path.dirname(path)
-
-            frame_sequences = self.__get_frame_sequences(folder)
+            folder, publish_basename = os.path.split(path)
 
-            frame_sequence = frame_sequences[0]
-            first_frame = int(min(frame_sequence[1]))
-
-            path = path % first_frame
-
-        if not os.path.exists(path):
+            spec_match = _FRAME_SPEC_REGEX.match(publish_basename)
+            if spec_match:
+                first_frame, first_frame_name = self._min_frame_for_publish(
+                    folder, *spec_match.groups()
+                )
+                if first_frame is not None:
+                    # use the name as listed on disk, which may differ in case
+                    # from the publish path.
+                    path = os.path.join(folder, first_frame_name)
+                    path_verified = True
+            else:
+                # we can't tell which files belong to the publish, so fall back
+                # to inspecting the whole folder and using the first sequence
+                # found.
+                frame_sequences = self.__get_frame_sequences(folder)
+                if frame_sequences:
+                    path = path % frame_sequences[0][1]
+
+        if not path_verified and not os.path.exists(path):
             raise Exception("File not found on disk - '%s'" % path)
 
-        if name == _OPEN_FILE:
-            self._open_file(path, sg_publish_data)
-        if name == _ADD_AS_A_LAYER:
-            self._place_file(path, sg_publish_data)
+        if resolved_paths is not None:
+            resolved_paths[sg_publish_data["id"]] = path
 
-    ###########################################################################
-    # helper methods
+        return path
 
     def _open_file(self, path, sg_publish_data):
         """
@@ -183,10 +290,11 @@ class PhotoshopActions(HookBaseClass):
         :param sg_publish_data: Shotgun data dictionary with all the standard
                                 publish fields.
         """
-        path = "/".join(path.split(os.path.sep))
+        if not _SEP_IS_SLASH:
+            path = path.replace(os.path.sep, "/")
         self.parent.log_debug("Opening file: %s" % path)
-        file = self.parent.engine.adobe.File(path)
-        self.parent.engine.adobe.app.load(file)
+        # Build the File and load it in a single round trip to Photoshop.
+        self.parent.engine.adobe.rpc_eval("app.load(new File(%s));" % json.dumps(path))
 
     def _place_file(self, path, sg_publish_data):
         """
@@ -196,7 +304,8 @@ class PhotoshopActions(HookBaseClass):
         :param sg_publish_data: Shotgun data dictionary with all the standard
                                 publish fields.
         """
-        path = "/".join(path.split(os.path.sep))
+        if not _SEP_IS_SLASH:
+            path = path.replace(os.path.sep, "/")
         adobe = self.parent.engine.adobe
 
         # We can't import in an empty scene.
@@ -224,35 +333,112 @@ class PhotoshopActions(HookBaseClass):
         #     // ... I have omitted the transform parameters. We'll take the defaults for now.
         # executeAction( idPlc, placeActionDesc, DialogModes.NO );
 
-        action_desc = adobe.ActionDescriptor()
-        action_desc.putPath(adobe.charIDToTypeID("null"), adobe.File(path))
-
+        # Rather than building the descriptor one proxied call at a time, the
+        # whole Place action is sent to Photoshop as a single script, which
+        # saves a round trip for every call below.
+        #
         # We're using the charIDs here, which are illegible. Included right
         # after is the string name of the ID, though even that isn't much
         # use in most cases.
         #
-        # Not sure why these are set, but they are mandatory and seem to be
-        # transform related. Omitting them makes the Place action fail, even
-        # if we don't specify a transform. These flags seem to be poorly
-        # documented and code samples found on the web using the Place action
-        # use them without any mention as to what they mean.
-        action_desc.putEnumerated(
-            adobe.charIDToTypeID("FTcs"),  # freeTransformCenterState
-            adobe.charIDToTypeID("QCSt"),  # quadCenterState
-            adobe.charIDToTypeID("Qcsa"),  # QCSAverage
-        )
+        # Not sure why the FTcs/QCSt/Qcsa flags are set, but they are
+        # mandatory and seem to be transform related. Omitting them makes the
+        # Place action fail, even if we don't specify a transform. These flags
+        # seem to be poorly documented and code samples found on the web using
+        # the Place action use them without any mention as to what they mean.
+        # The script is wrapped in a function so its variables don't leak
+        # into Photoshop's script engine, which is kept between evals.
+        place_script = (
+            "(function () {"
+            "var placeActionDesc = new ActionDescriptor();"
+            'placeActionDesc.putPath(charIDToTypeID("null"), new File(%s));'
+            "placeActionDesc.putEnumerated("
+            'charIDToTypeID("FTcs"), '  # freeTransformCenterState
+            'charIDToTypeID("QCSt"), '  # quadCenterState
+            'charIDToTypeID("Qcsa")'  # QCSAverage
+            ");"
+            # Everything is setup. Adds the layer to the document.
+            "executeAction("
+            'charIDToTypeID("Plc "), '  # placeEvent
+            "placeActionDesc, DialogModes.NO"
+            ");"
+            "})();"
+        ) % json.dumps(path)
+
+        adobe.rpc_eval(place_script)
 
-        # Everything is setup. Adds the layer to the document.
-        adobe.executeAction(
-            adobe.charIDToTypeID("Plc "),  # placeEvent
-            action_desc,
-            adobe.DialogModes.NO,
-        )
+    @staticmethod
+    def _min_frame_for_publish(folder, prefix, frame_sep, frame_spec, extension):
+        """
+        Find the first frame on disk of the sequence a publish refers to.
+
+        Only the files belonging to the publish's sequence are considered, so
+        other sequences rendered in the same folder don't need to be processed.
+        Files are only considered if their name is the publish file name
+        formatted with their frame number, so the returned frame is known to
+        exist on disk. Names are compared with ``os.path.normcase``, so case
+        is ignored where the platform does.
+
+        The publish file name parts are the groups matched by
+        ``_FRAME_SPEC_REGEX``, e.g. ``key_light1``, ``.``, ``%04d`` and ``exr``
+        for ``key_light1.%04d.exr``.
+
+        :param folder: The path to the folder containing the sequence files.
+        :param prefix: The publish file name before the frame separator.
+        :param frame_sep: The character separating the prefix from the frame.
+        :param frame_spec: The python string format frame spec.
+        :param extension: The publish file extension.
+        :return: A tuple with the lowest frame number found and the name of
+            its file as listed in the folder, or ``(None, None)`` if no frame of
+            the sequence could be found.
+        """
+        prefix = os.path.normcase(prefix)
+        frame_sep = os.path.normcase(frame_sep)
+        extension = os.path.normcase(extension)
+
+        min_frame = None
+        min_frame_name = None
+        for entry in _scan_folder(folder):
+            name = os.path.normcase(entry.name)
+
+            # cheap rejection of other sequences before running the regex
+            if not name.startswith(prefix):
+                continue
+
+            frame_pattern_match = _FRAME_REGEX.match(name)
+
+            if not frame_pattern_match:
+                # no frame number detected. carry on.
+                continue
+
+            if (
+                frame_pattern_match.group(1) != prefix
+                or frame_pattern_match.group(2) != frame_sep
+                or frame_pattern_match.group(4) != extension
+            ):
+                # belongs to another sequence
+                continue
+
+            if entry.is_dir(follow_symlinks=False):
+                # ignore subfolders
+                continue
+
+            frame_str = frame_pattern_match.group(3)
+            frame = int(frame_str)
+            if frame_spec % frame != frame_str:
+                # padding differs from the publish's
+                continue
+
+            if min_frame is None or frame < min_frame:
+                min_frame = frame
+                min_frame_name = entry.name
+
+        return min_frame, min_frame_name
 
     @staticmethod
     def __get_frame_sequences(folder, extensions=None, frame_spec=None):
         """
-        Copied from the publisher plugin, and customized to return file sequences with frame lists instead of filenames
+        Copied from the publisher plugin, and customized to return file sequences with their first frame instead of filenames
         Given a folder, inspect the contained files to find what appear to be
         files with frame numbers.
         :param folder: The path to a folder potentially containing a sequence of
@@ -265,7 +451,8 @@ class PhotoshopActions(HookBaseClass):
             item in the tuple is a sequence path with the frame number replaced
             with the supplied frame specification. If no frame spec is supplied,
             a python string format spec will be returned with the padding found
-            in the file.
+            in the file. The second item is the lowest frame number found
+            for the sequence, as an integer.
             Example::
             get_frame_sequences(
                 "/path/to/the/folder",
@@ -275,34 +462,34 @@ class PhotoshopActions(HookBaseClass):
             [
                 (
                     "/path/to/the/supplied/folder/key_light1.{FRAME}.exr",
-                    [<frame_1_framenumber>, <frame_2_framenumber>, ...]
+                    <first_framenumber>
                 ),
                 (
                     "/path/to/the/supplied/folder/fill_light1.{FRAME}.jpg",
-                    [<frame_1_framenumber>, <frame_2_framenumber>, ...]
+                    <first_framenumber>
                 )
             ]
         """
-        FRAME_REGEX = re.compile(r"(.*)([._-])(\d+)\.([^.]+)$", re.IGNORECASE)
-
         # list of already processed file names
         processed_names = {}
 
-        # examine the files in the folder
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
+        # frame specs already built, keyed by padding
+        padding_specs = {}
 
-            if os.path.isdir(file_path):
-                # ignore subfolders
-                continue
-
-            # see if there is a frame number
-            frame_pattern_match = re.search(FRAME_REGEX, filename)
+        # examine the files in the folder
+        for entry in _scan_folder(folder):
+            # see if there is a frame number. this is checked first so
+            # that non matching names never hit the file system.
+            frame_pattern_match = _FRAME_REGEX.match(entry.name)
 
             if not frame_pattern_match:
                 # no frame number detected. carry on.
                 continue
 
+            if entry.is_dir(follow_symlinks=False):
+                # ignore subfolders
+                continue
+
             prefix = frame_pattern_match.group(1)
             frame_sep = frame_pattern_match.group(2)
             frame_str = frame_pattern_match.group(3)
@@ -311,33 +498,38 @@ class PhotoshopActions(HookBaseClass):
             # filename without a frame number.
             file_no_frame = "%s.%s" % (prefix, extension)
 
-            if file_no_frame in processed_names:
-                # already processed this sequence. add the framenumber to the list, later we can use this to determine the framerange
-                processed_names[file_no_frame]["frame_list"].append(frame_str)
+            seq_info = processed_names.get(file_no_frame)
+            if seq_info is not None:
+                # already processed this sequence. only keep track of
+                # the lowest frame number, that's all the caller needs.
+                frame = int(frame_str)
+                if frame < seq_info["min_frame"]:
+                    seq_info["min_frame"] = frame
                 continue
 
             if extensions and extension not in extensions:
                 # not one of the extensions supplied
                 continue
 
-            # make sure we maintain the same padding
-            if not frame_spec:
+            # make sure we maintain the same padding for each sequence,
+            # rather than reusing the padding of the first one found.
+            spec = frame_spec
+            if not spec:
                 padding = len(frame_str)
-                frame_spec = "%%0%dd" % (padding,)
+                spec = padding_specs.get(padding)
+                if spec is None:
+                    spec = padding_specs[padding] = "%%0%dd" % (padding,)
 
-            seq_filename = "%s%s%s" % (prefix, frame_sep, frame_spec)
+            seq_filename = "%s%s%s" % (prefix, frame_sep, spec)
 
             if extension:
                 seq_filename = "%s.%s" % (seq_filename, extension)
 
-            # build the path in the same folder
-            seq_path = os.path.join(folder, seq_filename)
-
-            # remember each seq path identified and a list of files matching the
-            # seq pattern
+            # remember each seq file name identified and the lowest frame
+            # number matching the seq pattern
             processed_names[file_no_frame] = {
-                "sequence_path": seq_path,
-                "frame_list": [frame_str],
+                "sequence_filename": seq_filename,
+                "min_frame": int(frame_str),
             }
 
         # build the final list of sequence paths to return
@@ -345,8 +537,10 @@ class PhotoshopActions(HookBaseClass):
         for file_no_frame in processed_names:
 
             seq_info = processed_names[file_no_frame]
-            seq_path = seq_info["sequence_path"]
 
-            frame_sequences.append((seq_path, seq_info["frame_list"]))
+            # build the path in the same folder
+            seq_path = os.path.join(folder, seq_info["sequence_filename"])
+
+            frame_sequences.append((seq_path, seq_info["min_frame"]))
 
         return frame_sequences
@@ -0,0 +1,107 @@
+# Copyright (c) 2021 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+import os
+import shutil
+import tempfile
+
+import sgtk
+from tank_test.tank_test_base import TankTestBase, setUpModule  # noqa
+
+
+class TestPhotoshopActions(TankTestBase):
+    """
+    Tests the image sequence resolution of the Photoshop actions hook.
+    """
+
+    def setUp(self):
+        """
+        Set up before any tests are executed.
+        """
+        os.environ["LOADER2_API_TEST"] = "api_test"
+
+        super(TestPhotoshopActions, self).setUp()
+        self.setup_fixtures()
+
+        context = self.tk.context_from_entity(self.project["type"], self.project["id"])
+        self.engine = sgtk.platform.start_engine("tk-testengine", self.tk, context)
+        self.app = self.engine.apps["tk-multi-loader2"]
+
+        self.hook = self.app.create_hook_instance("{self}/tk-photoshopcc_actions.py")
+
+        # folder the sequence files are created in
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def tearDown(self):
+        """
+        Fixtures teardown
+        """
+        # engine is held as global, so must be destroyed.
+        cur_engine = sgtk.platform.current_engine()
+        if cur_engine:
+            cur_engine.destroy()
+
+        # important to call base class so it can clean up memory
+        super(TestPhotoshopActions, self).tearDown()
+
+    def _create_files(self, *names):
+        """
+        Create empty files with the given names in the test folder.
+        """
+        for name in names:
+            open(os.path.join(self.folder, name), "w").close()
+
+    def test_min_frame_for_publish(self):
+        """
+        Test only the files of the publish's sequence are considered
+        """
+        self._create_files(
+            "key.0003.exr",
+            "key.0002.exr",
+            "key.0010.exr",
+            # other sequence
+            "fill.0001.exr",
+            # other extension
+            "key.0001.jpg",
+            # other separator
+            "key_0001.exr",
+            # other padding
+            "key.1.exr",
+        )
+        # subfolders are ignored
+        os.mkdir(os.path.join(self.folder, "key.0000.exr"))
+
+        result = self.hook._min_frame_for_publish(
+            self.folder, "key", ".", "%04d", "exr"
+        )
+        assert result == (2, "key.0002.exr")
+
+    def test_min_frame_for_publish_not_found(self):
+        """
+        Test no frame is returned when the publish's sequence isn't on disk
+        """
+        self._create_files("fill.0001.exr", "key.1.exr")
+
+        result = self.hook._min_frame_for_publish(
+            self.folder, "key", ".", "%04d", "exr"
+        )
+        assert result == (None, None)
+
+    def test_frame_sequences_padding(self):
+        """
+        Test each sequence of a folder keeps its own padding
+        """
+        self._create_files("key.0002.exr", "key.0001.exr", "fill.01.exr")
+
+        frame_sequences = self.hook._PhotoshopActions__get_frame_sequences(self.folder)
+        assert sorted(frame_sequences) == [
+            (os.path.join(self.folder, "fill.%02d.exr"), 1),
+            (os.path.join(self.folder, "key.%04d.exr"), 1),
+        ]